@@ -0,0 +1,369 @@
+"""
+Near-duplicate answer cache for Chat AI
+- Character n-gram shingles + MinHash signatures
+- LSH banding for candidate lookup, exact Jaccard check on candidates
+- Questions are canonicalized first (contractions, "what is ..." prefixes, determiner articles, "or"/"versus" -> "vs")
+- Candidates must also have the same words, allowing only a one-typo difference on long words
+- Persisted in SQLite, LRU eviction
+- Writes are buffered in memory and persisted by flush() (meant for a worker thread)
+"""
+
+import sqlite3
+import random
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# MinHash / LSH parameters (BANDS * ROWS must equal NUM_PERM)
+NUM_PERM = 64
+BANDS = 16
+ROWS = 4
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures are stable across restarts
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERM)
+]
+
+# Words that never change what a question asks. Kept tiny on purpose: prepositions,
+# modals and verbs like "do"/"make"/"go" are often the topic itself.
+FILLER_WORDS = {"please", "pls"}
+
+# Contractions after normalize_text ("what's" -> "what s", "whats" stays one word)
+CONTRACTIONS = {
+    "whats": "what is", "hows": "how is", "whys": "why is", "wheres": "where is",
+    "s": "is", "re": "are", "m": "am", "ve": "have", "ll": "will", "d": "would", "t": "not",
+    "don": "do", "doesn": "does", "didn": "did", "isn": "is", "aren": "are", "wasn": "was",
+    "won": "will", "dont": "do not", "doesnt": "does not", "didnt": "did not",
+    "isnt": "is not", "arent": "are not", "cant": "can not", "wont": "will not",
+}
+
+# Ways to ask "X or Y" that all mean the same comparison
+SYNONYMS = {"versus": "vs", "v": "vs", "or": "vs"}
+
+# Question scaffolding stripped from the start ("what is the difference ..." = "difference ...")
+LEADING_PHRASES = [
+    ("can", "you", "explain"), ("could", "you", "explain"), ("can", "you", "tell", "me"),
+    ("tell", "me"), ("explain",), ("what", "is"), ("what", "are"),
+]
+
+ARTICLES = {"a", "an", "the"}
+CONNECTORS = {"vs", "and"}
+
+# Typos are only forgiven on long words: short pairs like go/do, make/take,
+# house/mouse or desert/dessert are different questions
+TYPO_MIN_LENGTH = 7
+
+
+def get_shingles(normalized: str) -> set[str]:
+    """Character n-gram shingles of a normalized question"""
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def canonical_question(text: str) -> str:
+    """
+    Normalize a question so that different phrasings of the same question become equal.
+
+    Articles are dropped only as determiners ("the difference"); an article that
+    is compared or stands at the end ("a vs an", "when to use the") is kept.
+    """
+    words = []
+    for word in normalize_text(text).split():
+        if word in FILLER_WORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        words.extend(CONTRACTIONS.get(word, word).split())
+
+    stripped = True
+    while stripped:
+        stripped = False
+        for phrase in LEADING_PHRASES:
+            if tuple(words[:len(phrase)]) == phrase and len(words) > len(phrase):
+                words = words[len(phrase):]
+                stripped = True
+
+    canonical = [
+        word for i, word in enumerate(words)
+        if not (
+            word in ARTICLES
+            and i + 1 < len(words)
+            and words[i + 1] not in ARTICLES | CONNECTORS
+        )
+    ]
+    return " ".join(canonical)
+
+
+def is_typo(a: str, b: str) -> bool:
+    """One inserted, deleted or swapped character between two long words"""
+    if min(len(a), len(b)) < TYPO_MIN_LENGTH:
+        return False
+
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return (
+            len(diffs) == 2
+            and diffs[1] == diffs[0] + 1
+            and a[diffs[0]] == b[diffs[1]]
+            and a[diffs[1]] == b[diffs[0]]
+        )
+
+    if abs(len(a) - len(b)) != 1:
+        return False
+
+    longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+    return any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer)))
+
+
+def words_match(a: frozenset[str], b: frozenset[str]) -> bool:
+    """Same word sets, except for words that are one typo apart"""
+    only_a, only_b = a - b, b - a
+    if len(only_a) != len(only_b):
+        return False
+
+    unmatched = set(only_b)
+    for word in only_a:
+        match = next((other for other in unmatched if is_typo(word, other)), None)
+        if match is None:
+            return False
+        unmatched.remove(match)
+    return True
+
+
+def minhash_signature(shingles: set[str]) -> list[int]:
+    """MinHash signature of a shingle set"""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    """Exact Jaccard similarity of two shingle sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """LSH index over normalized questions with cached answers"""
+
+    def __init__(self, db_path: Path | None = None, threshold: float = 0.82, max_entries: int = 5000):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # normalized question -> {"answer", "shingles", "words", "bands", "hits", "last_used"}
+        # Ordered from least to most recently used
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._buckets: dict[tuple, set[str]] = {}
+
+        # Pending writes, persisted by flush(). The lock guards them (and the
+        # entries flush() reads) because flush() runs in a worker thread.
+        self._dirty: set[str] = set()
+        self._pending_puts: dict[str, str] = {}
+        self._pending_deletes: set[str] = set()
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    # ---------- persistence ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                question TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                hits INTEGER DEFAULT 0,
+                created_at TEXT,
+                last_used TEXT
+            )
+        """)
+        return conn
+
+    def load(self):
+        """Load persisted entries and rebuild the LSH index"""
+        if not self.db_path:
+            return
+
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT question, answer, hits, last_used FROM answer_cache ORDER BY last_used"
+        ).fetchall()
+        conn.close()
+
+        for stored, answer, hits, last_used in rows:
+            question = canonical_question(stored)
+            if not question:
+                continue
+            self._index(question, answer, hits, last_used)
+
+            # Rows saved before canonicalization are re-keyed by the next flush()
+            if question != stored:
+                self._pending_deletes.add(stored)
+                self._pending_puts[question] = answer
+
+        self._evict()
+        logger.info(f"✅ Answer cache loaded: {len(self._entries)} entries")
+
+    def flush(self):
+        """Persist new answers, evictions, hit counters and recency in one transaction"""
+        if not self.db_path:
+            return
+
+        with self._lock:
+            puts, self._pending_puts = self._pending_puts, {}
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            dirty, self._dirty = self._dirty, set()
+
+            put_rows = [
+                (q, answer, self._entries[q]["last_used"], self._entries[q]["last_used"])
+                for q, answer in puts.items() if q in self._entries
+            ]
+            hit_rows = [
+                (self._entries[q]["hits"], self._entries[q]["last_used"], q)
+                for q in dirty if q in self._entries
+            ]
+
+        if not (put_rows or deletes or hit_rows):
+            return
+
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany("DELETE FROM answer_cache WHERE question = ?", [(q,) for q in deletes])
+                conn.executemany("""
+                    INSERT OR REPLACE INTO answer_cache (question, answer, hits, created_at, last_used)
+                    VALUES (?, ?, 0, ?, ?)
+                """, put_rows)
+                conn.executemany("UPDATE answer_cache SET hits = ?, last_used = ? WHERE question = ?", hit_rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Re-queue unless newer writes for the same question arrived meanwhile
+            with self._lock:
+                for q, answer in puts.items():
+                    if q not in self._pending_deletes:
+                        self._pending_puts.setdefault(q, answer)
+                self._pending_deletes |= {q for q in deletes if q not in self._pending_puts}
+                self._dirty |= dirty
+            raise
+
+    # ---------- index ----------
+
+    def _bands(self, shingles: set[str]) -> list[tuple]:
+        signature = minhash_signature(shingles)
+        return [(i, tuple(signature[i * ROWS:(i + 1) * ROWS])) for i in range(BANDS)]
+
+    def _index(self, question: str, answer: str, hits: int = 0, last_used: str | None = None):
+        shingles = get_shingles(question)
+        bands = self._bands(shingles)
+
+        self._entries[question] = {
+            "answer": answer,
+            "shingles": shingles,
+            "words": frozenset(question.split()),
+            "bands": bands,
+            "hits": hits,
+            "last_used": last_used or datetime.now().isoformat(),
+        }
+        self._entries.move_to_end(question)
+
+        for band in bands:
+            self._buckets.setdefault(band, set()).add(question)
+
+    def _remove(self, question: str):
+        entry = self._entries.pop(question)
+        self._dirty.discard(question)
+        self._pending_puts.pop(question, None)
+
+        for band in entry["bands"]:
+            bucket = self._buckets.get(band)
+            if bucket:
+                bucket.discard(question)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _evict(self) -> list[str]:
+        """Drop least recently used entries above max_entries"""
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            question = next(iter(self._entries))
+            self._remove(question)
+            evicted.append(question)
+        return evicted
+
+    # ---------- public API ----------
+
+    def get(self, text: str) -> str | None:
+        """Return a cached answer for a near-duplicate question, if any"""
+        self.lookups += 1
+
+        question = canonical_question(text)
+        if not question:
+            return None
+
+        entry = self._entries.get(question)
+        if entry is None:
+            shingles = get_shingles(question)
+            words = frozenset(question.split())
+            candidates = set()
+            for band in self._bands(shingles):
+                candidates |= self._buckets.get(band, set())
+
+            best_score = 0.0
+            for candidate in candidates:
+                # "past tense of go" vs "past tense of do" share most shingles but not the question
+                if not words_match(self._entries[candidate]["words"], words):
+                    continue
+                score = jaccard(shingles, self._entries[candidate]["shingles"])
+                if score > best_score:
+                    best_score, question = score, candidate
+
+            if best_score < self.threshold:
+                return None
+            entry = self._entries[question]
+
+        self.hits += 1
+        with self._lock:
+            entry["hits"] += 1
+            entry["last_used"] = datetime.now().isoformat()
+            self._entries.move_to_end(question)
+            self._dirty.add(question)
+
+        return entry["answer"]
+
+    def put(self, text: str, answer: str):
+        """Cache an answer for a question (no I/O, persisted by the next flush())"""
+        question = canonical_question(text)
+        if not question or not answer:
+            return
+
+        with self._lock:
+            if question in self._entries:
+                self._remove(question)
+
+            self._index(question, answer)
+            self._pending_puts[question] = answer
+            self._pending_deletes.discard(question)
+            self._pending_deletes.update(self._evict())
+
+    def __len__(self) -> int:
+        return len(self._entries)
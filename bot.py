@@ -5,16 +5,29 @@ AI English Tutor Bot
 - Channel Subscription Check
 - Referral System with Premium Rewards
 - Daily Request Limits
+- Near-duplicate Answer Cache for Chat AI
+- Offline English-Uzbek Dictionary for short translations
+- Per-update User Context Middleware
+- Opt-in Per-update Tracing with Slow Log
+- Model Call Timeouts, Circuit Breaker, Hedging and Fallbacks
+- Batched Usage Ledger with Daily Rollups for /stats
+- Online Backups and Database Maintenance
 """
 
 import asyncio
+import html
 import sqlite3
 import os
 import logging
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Awaitable, Callable
 
-from aiogram import Bot, Dispatcher, types, F, Router
+from aiogram import Bot, Dispatcher, types, F, Router, BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
 from aiogram.filters import Command, CommandStart
 from aiogram.types import (
     InlineKeyboardMarkup, 
@@ -29,6 +42,13 @@ from aiogram.fsm.state import State, StatesGroup
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
+from answer_cache import AnswerCache
+from dictionary import load_dictionary
+from tracing import start_trace, finish_trace, span, setup_slow_log
+from model_client import ModelClient
+from usage_ledger import UsageLedger, init_ledger, get_usage_summary
+from db_maintenance import backup_database, checkpoint, analyze
+
 # ================= CONFIGURATION =================
 load_dotenv()
 
@@ -48,12 +68,37 @@ FREE_DAILY_LIMIT = 10
 REFERRALS_FOR_PREMIUM = 5
 PREMIUM_DAYS = 30
 
+# Answer cache (first-turn Chat AI questions)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.82"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_FLUSH_INTERVAL = 30
+
+# Offline dictionary (translate mode, single words and short phrases)
+DICTIONARY_PATH = Path(os.getenv("DICTIONARY_PATH", Path(__file__).parent / "en_uz.dict"))
+DICTIONARY_MAX_WORDS = 4
+
+# Model calls: per-mode latency budgets (seconds, fallback model included) and hedging
+MODEL = "gpt-4o-mini"
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL") or None
+MODEL_BUDGETS = {"chat": 20, "translate": 15, "speak": 20, "photo": 40}
+FALLBACK_TIMEOUT = float(os.getenv("FALLBACK_TIMEOUT", "10"))
+MODEL_HEDGING = os.getenv("MODEL_HEDGING", "0") == "1"
+
+# Usage ledger: seconds between batched writes
+USAGE_FLUSH_INTERVAL = 10
+
+# Database maintenance: backups every few hours, checkpoint + ANALYZE in quiet hours
+BACKUP_INTERVAL_HOURS = 6
+QUIET_HOURS = (3, 4, 5)
+MAINTENANCE_CHECK_MINUTES = 30
+
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ================= DATABASE =================
 DB_PATH = Path(__file__).parent / "ai_tutor_bot.db"
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", Path(__file__).parent / "backups"))
 
 
 def init_database():
@@ -61,6 +106,9 @@ def init_database():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # WAL lets backups and checkpoints run without blocking handlers
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
@@ -151,6 +199,16 @@ def get_all_users_count() -> int:
     return count
 
 
+def get_premium_users_count() -> int:
+    """Get count of users with active premium"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM users WHERE premium_end_date > ?", (datetime.now().isoformat(),))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
 def reset_all_daily_limits():
     """Reset daily requests for all non-premium users (call at midnight)"""
     conn = sqlite3.connect(DB_PATH)
@@ -212,22 +270,6 @@ def check_and_reset_daily(user: dict) -> dict:
     return user
 
 
-def can_make_request(user: dict) -> tuple[bool, str]:
-    """Check if user can make a request. Returns (can_request, message)"""
-    if not user:
-        return False, "User not found"
-    
-    # Premium users have unlimited
-    if is_premium(user):
-        return True, ""
-    
-    # Check daily limit
-    if user.get("daily_requests", 0) > 0:
-        return True, ""
-    
-    return False, "limit_reached"
-
-
 def decrement_daily_request(user_id: int):
     """Decrease daily request count by 1"""
     conn = sqlite3.connect(DB_PATH)
@@ -275,12 +317,35 @@ router = Router()
 dp.include_router(router)
 
 # OpenAI client
+# The SDK retries transient errors (429, 5xx, connection resets); ModelClient's
+# per-mode deadline caps the total time, retries included
 openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+model_client = ModelClient(
+    openai_client,
+    model=MODEL,
+    budgets=MODEL_BUDGETS,
+    fallback_model=FALLBACK_MODEL,
+    fallback_timeout=FALLBACK_TIMEOUT,
+    hedging=MODEL_HEDGING
+)
 
 # User modes (in-memory)
 user_modes = {}  # chat | translate | speak
 chat_history = {}
 
+# Cached answers for frequent first-turn Chat AI questions, persisted by answer_cache_flush_scheduler()
+answer_cache = AnswerCache(DB_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES)
+
+# Memory-mapped dictionary, opened in main()
+dictionary = None
+
+# Usage events, written in batches by usage_flush_scheduler()
+usage_ledger = UsageLedger(DB_PATH)
+
+# Last results of maintenance_scheduler() jobs (shown by /maintenance)
+# "errors" holds the last failure per job, cleared when that job succeeds again
+maintenance_status = {"backup": None, "checkpoint": None, "analyze": None, "errors": {}}
+
 
 # ================= CHANNEL SUBSCRIPTION CHECK =================
 
@@ -306,20 +371,119 @@ def get_subscribe_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
-async def require_subscription(message: types.Message) -> bool:
-    """Check subscription and send message if not subscribed. Returns True if subscribed."""
-    user_id = message.from_user.id
-    
-    if await check_subscription(user_id):
-        return True
-    
+async def send_subscribe_prompt(message: types.Message):
+    """Ask the user to subscribe to the channel"""
     await message.answer(
         "⚠️ <b>Botdan foydalanish uchun kanalimizga a'zo bo'ling!</b>\n\n"
         "Kanalga a'zo bo'lgandan keyin \"✅ A'zo bo'ldim\" tugmasini bosing.",
         reply_markup=get_subscribe_keyboard(),
         parse_mode="HTML"
     )
-    return False
+
+
+# ================= USER CONTEXT MIDDLEWARE =================
+
+@dataclass
+class UserContext:
+    """User state resolved once per update and passed to handlers as `user_ctx`"""
+    user: dict | None
+    premium: bool
+    remaining: int | None  # None = unlimited (premium)
+    
+    @property
+    def can_request(self) -> bool:
+        """Premium users are unlimited, free users need daily requests left"""
+        if not self.user:
+            return False
+        return self.premium or self.remaining > 0
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """
+    Check subscription once per message and, for handlers that need it, resolve
+    the user row, premium flag and remaining quota into `user_ctx`.
+    
+    Handler flags:
+    - needs_user: load the user (and pass `user_ctx`); other handlers touch no DB
+    - skip_subscription: don't require channel subscription (admin commands)
+    - registers_user: don't auto-create the user row (/start handles referrals)
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[types.Message, dict[str, Any]], Awaitable[Any]],
+        event: types.Message,
+        data: dict[str, Any]
+    ) -> Any:
+        user_id = event.from_user.id
+        
+        with span("check_subscription"):
+            subscribed = get_flag(data, "skip_subscription") or await check_subscription(user_id)
+        
+        if not subscribed:
+            await send_subscribe_prompt(event)
+            return None
+        
+        if not get_flag(data, "needs_user"):
+            return await handler(event, data)
+        
+        with span("sqlite.user_context"):
+            user = get_user(user_id)
+            
+            if not user and not get_flag(data, "registers_user"):
+                create_user(user_id, event.from_user.username, event.from_user.first_name)
+                user = get_user(user_id)
+            
+            # Check and reset daily if new day
+            user = check_and_reset_daily(user)
+        
+        premium = is_premium(user)
+        
+        data["user_ctx"] = UserContext(
+            user=user,
+            premium=premium,
+            remaining=None if premium else (user or {}).get("daily_requests", 0)
+        )
+        return await handler(event, data)
+
+
+router.message.middleware(UserContextMiddleware())
+
+
+# ================= TRACING MIDDLEWARE =================
+
+class TracingMiddleware(BaseMiddleware):
+    """Start a (sampled) trace for every update"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[types.Update, dict[str, Any]], Awaitable[Any]],
+        event: types.Update,
+        data: dict[str, Any]
+    ) -> Any:
+        trace = start_trace(f"update.{event.event_type}", update_id=event.update_id)
+        if trace is None:
+            return await handler(event, data)
+        
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            finish_trace(trace)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Record a span for every Bot API call (get_chat_member, send_message, ...)"""
+    
+    async def __call__(self, make_request, bot: Bot, method):
+        with span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+dp.update.outer_middleware(TracingMiddleware())
+bot.session.middleware(TracingRequestMiddleware())
 
 
 # ================= CALLBACK HANDLER =================
@@ -357,17 +521,13 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
 
 # ================= COMMAND HANDLERS =================
 
-@router.message(CommandStart())
-async def cmd_start(message: types.Message):
+@router.message(CommandStart(), flags={"needs_user": True, "registers_user": True})
+async def cmd_start(message: types.Message, user_ctx: UserContext):
     """Handle /start command with referral support"""
     user_id = message.from_user.id
     username = message.from_user.username
     first_name = message.from_user.first_name
     
-    # Check channel subscription first
-    if not await require_subscription(message):
-        return
-    
     # Parse referral from start parameter
     args = message.text.split()
     referred_by = None
@@ -381,10 +541,7 @@ async def cmd_start(message: types.Message):
         except ValueError:
             referred_by = None
     
-    # Check if user exists
-    existing_user = get_user(user_id)
-    
-    if not existing_user:
+    if not user_ctx.user:
         # New user
         create_user(user_id, username, first_name, referred_by)
         
@@ -443,9 +600,6 @@ async def cmd_start(message: types.Message):
 @router.message(Command("help"))
 async def cmd_help(message: types.Message):
     """Handle /help command"""
-    if not await require_subscription(message):
-        return
-    
     await message.answer(
         "ℹ️ <b>YORDAM</b>\n\n"
         "🧠 <b>Chat AI</b> — ingliz tili bo'yicha savol-javob\n"
@@ -461,24 +615,17 @@ async def cmd_help(message: types.Message):
     )
 
 
-@router.message(Command("referal"))
-async def cmd_referal(message: types.Message):
+@router.message(Command("referal"), flags={"needs_user": True})
+async def cmd_referal(message: types.Message, user_ctx: UserContext):
     """Handle /referal command"""
-    if not await require_subscription(message):
-        return
-    
     user_id = message.from_user.id
-    user = get_user(user_id)
-    
-    if not user:
-        create_user(user_id, message.from_user.username, message.from_user.first_name)
-        user = get_user(user_id)
+    user = user_ctx.user
     
     referral_link = get_referral_link(user_id)
     referrals_count = user.get("referrals_count", 0)
     remaining = REFERRALS_FOR_PREMIUM - (referrals_count % REFERRALS_FOR_PREMIUM)
     
-    status = "💎 PREMIUM" if is_premium(user) else "🆓 FREE"
+    status = "💎 PREMIUM" if user_ctx.premium else "🆓 FREE"
     
     await message.answer(
         f"🔗 <b>REFERAL DASTURI</b>\n\n"
@@ -494,7 +641,7 @@ async def cmd_referal(message: types.Message):
     )
 
 
-@router.message(Command("stats"))
+@router.message(Command("stats"), flags={"skip_subscription": True})
 async def cmd_stats(message: types.Message):
     """Handle /stats command (admin only)"""
     if message.from_user.id != ADMIN_ID:
@@ -502,15 +649,35 @@ async def cmd_stats(message: types.Message):
         return
     
     total = get_all_users_count()
+    premium = get_premium_users_count()
+    conversion = premium / total * 100 if total else 0
+    usage = get_usage_summary(DB_PATH)
+    
+    modes_text = "\n".join(
+        f"   • {mode}: <b>{count}</b>" for mode, count in usage["modes_today"].items()
+    ) or "   • —"
     
     await message.answer(
         f"📊 <b>BOT STATISTIKASI</b>\n\n"
-        f"👥 Jami foydalanuvchilar: <b>{total}</b>",
+        f"👥 Jami foydalanuvchilar: <b>{total}</b>\n"
+        f"💎 Premium: <b>{premium}</b> ({conversion:.1f}%)\n\n"
+        f"━━━━━━━━━━━━━━━━\n"
+        f"📅 <b>Bugun:</b>\n"
+        f"🟢 Faol foydalanuvchilar (DAU): <b>{usage['dau']}</b>\n"
+        f"💬 So'rovlar: <b>{usage['requests_today']}</b>\n"
+        f"🔤 Tokenlar: <b>{usage['tokens_today']}</b>\n"
+        f"⚡ Keshdan: <b>{usage['cache_hits_today']}</b>\n"
+        f"⏱ O'rtacha javob: <b>{usage['avg_latency_ms']:.0f} ms</b>\n"
+        f"{modes_text}\n\n"
+        f"📆 <b>Oxirgi {usage['days']} kun:</b>\n"
+        f"🟢 Faol foydalanuvchilar: <b>{usage['active_period']}</b>\n"
+        f"💬 So'rovlar: <b>{usage['requests_period']}</b>\n"
+        f"🔤 Tokenlar: <b>{usage['tokens_period']}</b>",
         parse_mode="HTML"
     )
 
 
-@router.message(Command("reset_limits"))
+@router.message(Command("reset_limits"), flags={"skip_subscription": True})
 async def cmd_reset_limits(message: types.Message):
     """Manual reset of daily limits (admin only)"""
     if message.from_user.id != ADMIN_ID:
@@ -521,33 +688,67 @@ async def cmd_reset_limits(message: types.Message):
     await message.answer("✅ Barcha foydalanuvchilar uchun kunlik limitlar qayta tiklandi.")
 
 
-# ================= PROFILE & MENU HANDLERS =================
-
-@router.message(F.text == "👤 Profil")
-async def show_profile(message: types.Message):
-    """Show user profile"""
-    if not await require_subscription(message):
+@router.message(Command("maintenance"), flags={"skip_subscription": True})
+async def cmd_maintenance(message: types.Message):
+    """Show last backup and maintenance status (admin only)"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("⛔ Bu buyruq faqat admin uchun.")
         return
     
-    user_id = message.from_user.id
-    user = get_user(user_id)
+    backup = maintenance_status["backup"]
+    ckpt = maintenance_status["checkpoint"]
+    stats = maintenance_status["analyze"]
+    errors = maintenance_status["errors"]
     
-    if not user:
-        create_user(user_id, message.from_user.username, message.from_user.first_name)
-        user = get_user(user_id)
+    if backup:
+        backup_text = (
+            f"{backup['time'].strftime('%d.%m.%Y %H:%M')} — "
+            f"{backup['size'] / 1024:.0f} KB, {backup['duration']:.1f} s\n"
+            f"<code>{Path(backup['path']).name}</code>"
+        )
+    else:
+        backup_text = "hali yo'q"
     
-    # Check and reset daily if new day
-    user = check_and_reset_daily(user)
+    if ckpt:
+        ckpt_text = (
+            f"{ckpt['time'].strftime('%d.%m.%Y %H:%M')} — {ckpt['mode']}, "
+            f"{ckpt['checkpointed']}/{ckpt['log_frames']} sahifa"
+        )
+    else:
+        ckpt_text = "hali yo'q"
     
-    premium_status = is_premium(user)
+    analyze_text = stats["time"].strftime("%d.%m.%Y %H:%M") if stats else "hali yo'q"
     
-    if premium_status:
+    text = (
+        f"🛠 <b>BAZA HOLATI</b>\n\n"
+        f"💾 Oxirgi backup: {backup_text}\n\n"
+        f"📝 Checkpoint: {ckpt_text}\n"
+        f"📈 ANALYZE: {analyze_text}"
+    )
+    for name, (failed_at, error) in errors.items():
+        text += (
+            f"\n\n❌ {name} xatosi ({failed_at.strftime('%d.%m.%Y %H:%M')}):\n"
+            f"<code>{html.escape(error)}</code>"
+        )
+    
+    await message.answer(text, parse_mode="HTML")
+
+
+# ================= PROFILE & MENU HANDLERS =================
+
+@router.message(F.text == "👤 Profil", flags={"needs_user": True})
+async def show_profile(message: types.Message, user_ctx: UserContext):
+    """Show user profile"""
+    user_id = message.from_user.id
+    user = user_ctx.user
+    
+    if user_ctx.premium:
         end_date = datetime.fromisoformat(user["premium_end_date"]).strftime("%d.%m.%Y")
         status_text = f"💎 <b>PREMIUM</b> ({end_date} gacha)"
         limit_text = "♾ <b>CHEKSIZ</b>"
     else:
         status_text = "🆓 FREE"
-        limit_text = f"📊 <b>{user.get('daily_requests', 0)}/{FREE_DAILY_LIMIT}</b>"
+        limit_text = f"📊 <b>{user_ctx.remaining}/{FREE_DAILY_LIMIT}</b>"
     
     await message.answer(
         f"👤 <b>SIZNING PROFILINGIZ</b>\n\n"
@@ -562,10 +763,10 @@ async def show_profile(message: types.Message):
     )
 
 
-@router.message(F.text == "🔗 Referal")
-async def show_referal(message: types.Message):
+@router.message(F.text == "🔗 Referal", flags={"needs_user": True})
+async def show_referal(message: types.Message, user_ctx: UserContext):
     """Show referral link"""
-    await cmd_referal(message)
+    await cmd_referal(message, user_ctx)
 
 
 # ================= MODE SWITCH HANDLERS =================
@@ -573,9 +774,6 @@ async def show_referal(message: types.Message):
 @router.message(F.text == "🧠 Chat AI")
 async def set_chat_mode(message: types.Message):
     """Switch to chat mode"""
-    if not await require_subscription(message):
-        return
-    
     user_modes[message.from_user.id] = "chat"
     chat_history[message.from_user.id] = []
     await message.answer("🧠 <b>Chat AI</b> rejimi yoqildi.\n\nSavol bering!", parse_mode="HTML")
@@ -584,9 +782,6 @@ async def set_chat_mode(message: types.Message):
 @router.message(F.text == "📘 Tarjima")
 async def set_translate_mode(message: types.Message):
     """Switch to translate mode"""
-    if not await require_subscription(message):
-        return
-    
     user_modes[message.from_user.id] = "translate"
     await message.answer("📘 <b>Tarjima</b> rejimi yoqildi.\n\nMatn yuboring!", parse_mode="HTML")
 
@@ -594,9 +789,6 @@ async def set_translate_mode(message: types.Message):
 @router.message(F.text == "🗣 Speak English")
 async def set_speak_mode(message: types.Message):
     """Switch to speak mode"""
-    if not await require_subscription(message):
-        return
-    
     user_modes[message.from_user.id] = "speak"
     await message.answer(
         "🗣 <b>Speak English</b> rejimi yoqildi.\n\n"
@@ -607,22 +799,10 @@ async def set_speak_mode(message: types.Message):
 
 # ================= LIMIT CHECK DECORATOR =================
 
-async def check_limits_and_notify(message: types.Message) -> bool:
+async def check_limits_and_notify(message: types.Message, user_ctx: UserContext) -> bool:
     """Check limits and send message if exceeded. Returns True if can proceed."""
-    user_id = message.from_user.id
-    user = get_user(user_id)
-    
-    if not user:
-        create_user(user_id, message.from_user.username, message.from_user.first_name)
-        user = get_user(user_id)
-    
-    # Check and reset if new day
-    user = check_and_reset_daily(user)
-    
-    can_request, reason = can_make_request(user)
-    
-    if not can_request:
-        referral_link = get_referral_link(user_id)
+    if not user_ctx.can_request:
+        referral_link = get_referral_link(message.from_user.id)
         await message.answer(
             f"⚠️ <b>Limitingiz tugadi!</b>\n\n"
             f"Kunlik limit: <b>0/{FREE_DAILY_LIMIT}</b>\n\n"
@@ -641,19 +821,13 @@ async def check_limits_and_notify(message: types.Message) -> bool:
 
 # ================= TEXT MESSAGE HANDLER =================
 
-@router.message(F.text)
-async def handle_text(message: types.Message):
+@router.message(F.text & ~F.text.startswith("/"), flags={"needs_user": True})
+async def handle_text(message: types.Message, user_ctx: UserContext):
     """Handle text messages"""
-    # Skip commands
-    if message.text.startswith("/"):
-        return
-    
-    # Check subscription
-    if not await require_subscription(message):
-        return
+    started = time.monotonic()
     
     # Check limits
-    if not await check_limits_and_notify(message):
+    if not await check_limits_and_notify(message, user_ctx):
         return
     
     user_id = message.from_user.id
@@ -671,31 +845,68 @@ async def handle_text(message: types.Message):
     if user_id not in chat_history:
         chat_history[user_id] = []
     
+    # Only first-turn chat questions are answered from / stored in the cache
+    cacheable = mode == "chat" and not chat_history[user_id]
+    
     chat_history[user_id].append({"role": "user", "content": message.text})
     if len(chat_history[user_id]) > 2:
         chat_history[user_id].pop(0)
     
+    # Local fast paths: answer cache for chat, dictionary for short translations
+    answer = None
+    if cacheable:
+        with span("answer_cache"):
+            answer = answer_cache.get(message.text)
+    elif mode == "translate" and dictionary and len(message.text.split()) <= DICTIONARY_MAX_WORDS:
+        try:
+            with span("dictionary"):
+                answer = dictionary.lookup(message.text)
+        except Exception as e:
+            # Corrupt or truncated dictionary file: fall through to the model
+            logger.error(f"Dictionary lookup error: {e}")
+    
+    if answer:
+        chat_history[user_id].append({"role": "assistant", "content": answer})
+        
+        if not user_ctx.premium:
+            with span("sqlite.decrement"):
+                decrement_daily_request(user_id)
+        
+        await message.answer(answer)
+        usage_ledger.record(user_id, mode, latency_ms=(time.monotonic() - started) * 1000, cache_hit=True)
+        return
+    
     try:
         # Call OpenAI
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            max_tokens=180,
-            temperature=0.6,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                *chat_history[user_id]
-            ]
-        )
+        with span("openai", mode=mode):
+            completion = await model_client.complete(
+                mode,
+                max_tokens=180,
+                temperature=0.6,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    *chat_history[user_id]
+                ]
+            )
         
-        answer = response.choices[0].message.content
+        answer = completion.text
         chat_history[user_id].append({"role": "assistant", "content": answer})
         
+        if cacheable:
+            answer_cache.put(message.text, answer)
+        
         # Decrement daily request (only for free users)
-        user = get_user(user_id)
-        if not is_premium(user):
-            decrement_daily_request(user_id)
+        if not user_ctx.premium:
+            with span("sqlite.decrement"):
+                decrement_daily_request(user_id)
         
         await message.answer(answer)
+        usage_ledger.record(
+            user_id,
+            mode,
+            tokens=completion.tokens,
+            latency_ms=(time.monotonic() - started) * 1000
+        )
         
     except Exception as e:
         logger.error(f"OpenAI error: {e}")
@@ -704,13 +915,12 @@ async def handle_text(message: types.Message):
 
 # ================= PHOTO HANDLER =================
 
-@router.message(F.photo)
-async def handle_photo(message: types.Message):
+@router.message(F.photo, flags={"needs_user": True})
+async def handle_photo(message: types.Message, user_ctx: UserContext):
     """Handle photo messages for translation"""
-    if not await require_subscription(message):
-        return
+    started = time.monotonic()
     
-    if not await check_limits_and_notify(message):
+    if not await check_limits_and_notify(message, user_ctx):
         return
     
     user_id = message.from_user.id
@@ -722,26 +932,33 @@ async def handle_photo(message: types.Message):
         image_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file.file_path}"
         
         # Call OpenAI Vision
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            max_tokens=300,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Extract any text from this image and translate it to Uzbek."},
-                    {"type": "image_url", "image_url": {"url": image_url}}
-                ]
-            }]
-        )
+        with span("openai", mode="photo"):
+            completion = await model_client.complete(
+                "photo",
+                max_tokens=300,
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Extract any text from this image and translate it to Uzbek."},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]
+                }]
+            )
         
-        answer = response.choices[0].message.content
+        answer = completion.text
         
         # Decrement limit
-        user = get_user(user_id)
-        if not is_premium(user):
-            decrement_daily_request(user_id)
+        if not user_ctx.premium:
+            with span("sqlite.decrement"):
+                decrement_daily_request(user_id)
         
         await message.answer(answer)
+        usage_ledger.record(
+            user_id,
+            "photo",
+            tokens=completion.tokens,
+            latency_ms=(time.monotonic() - started) * 1000
+        )
         
     except Exception as e:
         logger.error(f"Photo processing error: {e}")
@@ -750,12 +967,9 @@ async def handle_photo(message: types.Message):
 
 # ================= VOICE HANDLER =================
 
-@router.message(F.voice)
-async def handle_voice(message: types.Message):
+@router.message(F.voice, flags={"needs_user": True})
+async def handle_voice(message: types.Message, user_ctx: UserContext):
     """Handle voice messages"""
-    if not await require_subscription(message):
-        return
-    
     user_id = message.from_user.id
     mode = user_modes.get(user_id, "chat")
     
@@ -763,7 +977,7 @@ async def handle_voice(message: types.Message):
         await message.answer("🗣 Avval \"Speak English\" rejimini tanlang!")
         return
     
-    if not await check_limits_and_notify(message):
+    if not await check_limits_and_notify(message, user_ctx):
         return
     
     try:
@@ -778,6 +992,7 @@ async def handle_voice(message: types.Message):
             "💡 Hozircha ovoz xabarlarni to'liq qo'llab-quvvatlash ustida ishlamoqdamiz.\n"
             "Matn yozib yuboring yoki \"Chat AI\" rejimidan foydalaning!"
         )
+        usage_ledger.record(user_id, "voice")
         
     except Exception as e:
         logger.error(f"Voice processing error: {e}")
@@ -802,20 +1017,95 @@ async def daily_reset_scheduler():
         logger.info("✅ Daily limits reset at midnight")
 
 
+# ================= SCHEDULER FOR DATABASE MAINTENANCE =================
+
+async def run_maintenance_job(name: str, job, *args):
+    """Run a blocking maintenance job in a worker thread and record its result"""
+    try:
+        maintenance_status[name] = await asyncio.to_thread(job, *args)
+        maintenance_status["errors"].pop(name, None)
+        return maintenance_status[name]
+    except Exception as e:
+        maintenance_status["errors"][name] = (datetime.now(), f"{type(e).__name__}: {e}")
+        logger.error(f"Maintenance {name} error: {e}")
+        return None
+
+
+async def maintenance_scheduler():
+    """Background task for online backups, WAL checkpoints and ANALYZE"""
+    while True:
+        now = datetime.now()
+        
+        backup = maintenance_status["backup"]
+        if not backup or now - backup["time"] >= timedelta(hours=BACKUP_INTERVAL_HOURS):
+            if await run_maintenance_job("backup", backup_database, DB_PATH, BACKUP_DIR):
+                logger.info("✅ Database backup done")
+        
+        stats = maintenance_status["analyze"]
+        if now.hour in QUIET_HOURS and (not stats or stats["time"].date() < now.date()):
+            await run_maintenance_job("checkpoint", checkpoint, DB_PATH, "TRUNCATE")
+            if await run_maintenance_job("analyze", analyze, DB_PATH):
+                logger.info("✅ Database checkpoint and ANALYZE done")
+        else:
+            # Cheap, never blocks writers; keeps the WAL file from growing
+            await run_maintenance_job("checkpoint", checkpoint, DB_PATH)
+        
+        await asyncio.sleep(MAINTENANCE_CHECK_MINUTES * 60)
+
+
+# ================= SCHEDULER FOR ANSWER CACHE =================
+
+async def answer_cache_flush_scheduler():
+    """Background task to persist new cached answers and hit counters"""
+    while True:
+        await asyncio.sleep(ANSWER_CACHE_FLUSH_INTERVAL)
+        
+        try:
+            await asyncio.to_thread(answer_cache.flush)
+        except Exception as e:
+            logger.error(f"Answer cache flush error: {e}")
+
+
+# ================= SCHEDULER FOR USAGE LEDGER =================
+
+async def usage_flush_scheduler():
+    """Background task to write buffered usage events in batches"""
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        
+        try:
+            await asyncio.to_thread(usage_ledger.flush)
+        except Exception as e:
+            logger.error(f"Usage ledger flush error: {e}")
+
+
 # ================= MAIN =================
 
 async def main():
     """Main function to start the bot"""
     # Initialize database
     init_database()
+    init_ledger(DB_PATH)
+    answer_cache.load()
+    setup_slow_log()
+    
+    global dictionary
+    dictionary = load_dictionary(DICTIONARY_PATH)
     
     # Start daily reset scheduler in background
     asyncio.create_task(daily_reset_scheduler())
+    asyncio.create_task(usage_flush_scheduler())
+    asyncio.create_task(answer_cache_flush_scheduler())
+    asyncio.create_task(maintenance_scheduler())
     
     logger.info("🚀 Bot ishga tushdi!")
     
     # Start polling
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        answer_cache.flush()
+        usage_ledger.flush()
 
 
 if __name__ == "__main__":
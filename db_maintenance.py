@@ -0,0 +1,103 @@
+"""
+SQLite maintenance jobs (blocking, run them in a worker thread)
+- Online backup with the SQLite backup API, copied in small page steps
+- WAL checkpoints
+- ANALYZE for fresh query planner statistics
+
+Manual backup: python db_maintenance.py
+"""
+
+import os
+import sqlite3
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01
+BACKUP_KEEP = 7
+
+
+def backup_database(db_path: Path, backup_dir: Path, keep: int = BACKUP_KEEP) -> dict:
+    """Copy the live database page by page into a new backup file and drop old backups"""
+    backup_dir.mkdir(parents=True, exist_ok=True)
+
+    name = f"{db_path.stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+    target_path = backup_dir / name
+    tmp_path = target_path.with_suffix(".db.part")
+
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    start = time.monotonic()
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Other connections may write between steps; SQLite restarts the copy if they do
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=progress, sleep=BACKUP_STEP_SLEEP)
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    if check != "ok":
+        tmp_path.unlink(missing_ok=True)
+        raise sqlite3.DatabaseError(f"Backup integrity check failed: {check}")
+
+    os.replace(tmp_path, target_path)
+
+    # Rotate: keep the newest `keep` backups
+    backups = sorted(backup_dir.glob(f"{db_path.stem}-*.db"))
+    for old in backups[:-keep]:
+        old.unlink()
+
+    return {
+        "path": str(target_path),
+        "size": target_path.stat().st_size,
+        "steps": steps,
+        "duration": time.monotonic() - start,
+        "time": datetime.now()
+    }
+
+
+def checkpoint(db_path: Path, mode: str = "PASSIVE") -> dict:
+    """Run a WAL checkpoint (PASSIVE never blocks writers, TRUNCATE also shrinks the WAL file)"""
+    start = time.monotonic()
+    conn = sqlite3.connect(db_path)
+    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    conn.close()
+
+    return {
+        "mode": mode,
+        "busy": bool(busy),
+        "log_frames": log_frames,
+        "checkpointed": checkpointed,
+        "duration": time.monotonic() - start,
+        "time": datetime.now()
+    }
+
+
+def analyze(db_path: Path) -> dict:
+    """Refresh query planner statistics"""
+    start = time.monotonic()
+    conn = sqlite3.connect(db_path)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+    return {
+        "duration": time.monotonic() - start,
+        "time": datetime.now()
+    }
+
+
+if __name__ == "__main__":
+    db = Path(__file__).parent / "ai_tutor_bot.db"
+    info = backup_database(db, Path(os.getenv("BACKUP_DIR", db.parent / "backups")))
+    print(f"✅ Backup written to {info['path']} ({info['size']} bytes, {info['duration']:.2f} s)")
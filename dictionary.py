@@ -0,0 +1,152 @@
+"""
+Offline English-Uzbek dictionary
+- Compact binary file, memory-mapped (opening is O(1), no parsing at startup)
+- Open-addressing hash index over normalized keys (words and phrases)
+
+File layout (little-endian):
+    header   MAGIC | u32 entries | u32 slots
+    index    slots * u32  (record offset + 1, 0 = empty slot)
+    records  u16 key_len | key | u16 value_len | value   (UTF-8)
+
+Build with: python dictionary.py words.tsv en_uz.dict
+"""
+
+import mmap
+import struct
+import sys
+import zlib
+import logging
+from pathlib import Path
+
+from text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ENUZDIC1"
+_HEADER = struct.Struct("<8sII")
+_SLOT = struct.Struct("<I")
+_LEN = struct.Struct("<H")
+
+
+def normalize_key(text: str) -> str:
+    """Normalize a word or phrase the same way for building and lookup"""
+    return normalize_text(text)
+
+
+class Dictionary:
+    """Read-only, memory-mapped dictionary"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.entries, self.slots = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a dictionary file: {path}")
+
+        self._mask = self.slots - 1
+        self._index_start = _HEADER.size
+        self._data_start = self._index_start + self.slots * _SLOT.size
+
+    def lookup(self, text: str) -> str | None:
+        """Return the translation of a word or phrase, if known"""
+        key = normalize_key(text).encode("utf-8")
+        if not key:
+            return None
+
+        mm = self._mm
+        slot = zlib.crc32(key) & self._mask
+
+        while True:
+            (ref,) = _SLOT.unpack_from(mm, self._index_start + slot * _SLOT.size)
+            if ref == 0:
+                return None
+
+            pos = self._data_start + ref - 1
+            (key_len,) = _LEN.unpack_from(mm, pos)
+            pos += _LEN.size
+
+            if mm[pos:pos + key_len] == key:
+                pos += key_len
+                (value_len,) = _LEN.unpack_from(mm, pos)
+                pos += _LEN.size
+                return mm[pos:pos + value_len].decode("utf-8")
+
+            slot = (slot + 1) & self._mask
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.entries
+
+
+def load_dictionary(path: Path) -> Dictionary | None:
+    """Open the dictionary file, or return None if it is missing or invalid"""
+    if not path.exists():
+        logger.info(f"ℹ️ Dictionary not found at {path}, translate fast path disabled")
+        return None
+
+    try:
+        dictionary = Dictionary(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.error(f"Error loading dictionary: {e}")
+        return None
+
+    logger.info(f"✅ Dictionary loaded: {len(dictionary)} entries")
+    return dictionary
+
+
+def build_dictionary(pairs, path: Path) -> int:
+    """Write (english, uzbek) pairs to a dictionary file. Returns entry count."""
+    records = {}
+    for english, uzbek in pairs:
+        key = normalize_key(english).encode("utf-8")
+        value = uzbek.strip().encode("utf-8")
+        if key and value and len(key) <= 0xFFFF and len(value) <= 0xFFFF and key not in records:
+            records[key] = value
+
+    # Power-of-two table at most half full keeps probe chains short
+    slots = 1
+    while slots < len(records) * 2:
+        slots *= 2
+
+    index = [0] * slots
+    data = bytearray()
+
+    for key, value in records.items():
+        slot = zlib.crc32(key) & (slots - 1)
+        while index[slot]:
+            slot = (slot + 1) & (slots - 1)
+        index[slot] = len(data) + 1
+
+        data += _LEN.pack(len(key)) + key + _LEN.pack(len(value)) + value
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(records), slots))
+        f.write(struct.pack(f"<{slots}I", *index))
+        f.write(data)
+
+    return len(records)
+
+
+def read_tsv(path: Path):
+    """Yield (english, uzbek) pairs from a tab-separated file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                yield parts[0], parts[1]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python dictionary.py <words.tsv> <output.dict>")
+        sys.exit(1)
+
+    count = build_dictionary(read_tsv(Path(sys.argv[1])), Path(sys.argv[2]))
+    print(f"✅ {count} entries written to {sys.argv[2]}")
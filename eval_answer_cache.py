@@ -0,0 +1,163 @@
+"""
+Offline evaluation of the Chat AI answer cache
+- Replays a file of questions (one per line) through AnswerCache
+- Every miss is stored with a placeholder answer, like the bot does
+- Reports hit rate and lookup latency
+- With labelled pairs (answer_cache_pairs.tsv by default), reports precision (false hits)
+  and recall, plus a threshold sweep
+- Always checks built-in near-miss pairs; exits with 1 if any of them is served from the cache
+
+Usage: python eval_answer_cache.py [questions.txt] [--pairs pairs.tsv] [--threshold 0.82] [--max-entries 5000]
+Pairs file: one "label<TAB>cached question<TAB>new question" per line, label 1 = duplicate, 0 = different question
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from answer_cache import AnswerCache
+
+DEFAULT_PAIRS = Path(__file__).parent / "answer_cache_pairs.tsv"
+SWEEP_THRESHOLDS = [0.6, 0.7, 0.75, 0.8, 0.82, 0.85, 0.9]
+
+# Questions that differ in one key word: a hit here is a wrong answer
+NEAR_MISS_PAIRS = [
+    (0, "what is the past tense of go", "what is the past tense of do"),
+    (0, "what is the difference between make and do", "what is the difference between make and take"),
+    (0, "when do I use a or an", "when do I use a or the"),
+    (0, "difference between in and on", "difference between at and on"),
+    (0, "what is the plural of mouse", "what is the plural of house"),
+    (0, "what is the difference between desert and dessert", "what is the difference between desert and deserve"),
+    (0, "how do I use the past continuous", "how do I use the present continuous"),
+    (0, "translate 'I love you'", "translate 'you love I'"),
+    (1, "What is the difference between present perfect and past simple?",
+        "what's the difference between present perfect and past simple"),
+    (1, "What's the difference between make and do?", "what is the difference between make and do"),
+    (1, "What is the difference between make and do?", "What is the diference between make and do?"),
+    (1, "What is the difference between make and do?", "difference between make and do"),
+    (1, "present perfect vs past simple", "present perfect versus past simple"),
+]
+
+
+def evaluate_questions(path: str, threshold: float, max_entries: int):
+    with open(path, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    cache = AnswerCache(threshold=threshold, max_entries=max_entries)
+    latencies = []
+
+    for i, question in enumerate(questions):
+        start = time.perf_counter()
+        answer = cache.get(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if answer is None:
+            cache.put(question, f"answer #{i}")
+
+    if not latencies:
+        print("No questions to evaluate")
+        return
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    print(f"Questions:   {cache.lookups}")
+    print(f"Hits:        {cache.hits}")
+    print(f"Hit rate:    {cache.hits / cache.lookups:.1%}")
+    print(f"Entries:     {len(cache)}")
+    print(f"Latency p50: {statistics.median(latencies):.3f} ms")
+    print(f"Latency p95: {p95:.3f} ms")
+    print(f"Latency max: {latencies[-1]:.3f} ms")
+
+
+def score_pairs(pairs: list, threshold: float) -> tuple[int, list, list]:
+    """Replay labelled pairs, return (true hits, false hits, missed duplicates)"""
+    true_hits, false_hits, misses = 0, [], []
+
+    for label, cached, asked in pairs:
+        cache = AnswerCache(threshold=threshold)
+        cache.put(cached, "cached answer")
+        hit = cache.get(asked) is not None
+
+        if hit and label:
+            true_hits += 1
+        elif hit:
+            false_hits.append((cached, asked))
+        elif label:
+            misses.append((cached, asked))
+
+    return true_hits, false_hits, misses
+
+
+def evaluate_pairs(pairs: list, threshold: float, show_misses: bool = False) -> list:
+    """Print precision / recall for labelled pairs and return the false hits"""
+    true_hits, false_hits, misses = score_pairs(pairs, threshold)
+
+    duplicates = sum(1 for label, _, _ in pairs if label)
+    hits = true_hits + len(false_hits)
+
+    print(f"Pairs:          {len(pairs)} ({duplicates} duplicates)")
+    print(f"Precision:      {true_hits / hits:.1%}" if hits else "Precision:      n/a (no hits)")
+    print(f"Recall:         {true_hits / duplicates:.1%}" if duplicates else "Recall:         n/a")
+    print(f"False hit rate: {len(false_hits) / (len(pairs) - duplicates):.1%}" if len(pairs) > duplicates
+          else "False hit rate: n/a")
+    for cached, asked in false_hits:
+        print(f"  ❌ \"{asked}\" answered with \"{cached}\"")
+    if show_misses:
+        for cached, asked in misses:
+            print(f"  ➖ \"{asked}\" missed \"{cached}\"")
+
+    return false_hits
+
+
+def sweep_thresholds(pairs: list):
+    """Print precision / recall for a range of thresholds"""
+    duplicates = sum(1 for label, _, _ in pairs if label)
+    print("Threshold  Precision  Recall")
+    for threshold in SWEEP_THRESHOLDS:
+        true_hits, false_hits, _ = score_pairs(pairs, threshold)
+        hits = true_hits + len(false_hits)
+        precision = f"{true_hits / hits:.1%}" if hits else "n/a"
+        recall = f"{true_hits / duplicates:.1%}" if duplicates else "n/a"
+        print(f"{threshold:<9}  {precision:>9}  {recall:>6}")
+
+
+def read_pairs(path: str) -> list:
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 3:
+                pairs.append((int(parts[0]), parts[1], parts[2]))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the near-duplicate answer cache")
+    parser.add_argument("questions", nargs="?", help="Text file with one question per line")
+    parser.add_argument("--pairs", default=str(DEFAULT_PAIRS), help="TSV file with labelled question pairs")
+    parser.add_argument("--threshold", type=float, default=0.82)
+    parser.add_argument("--max-entries", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.questions:
+        evaluate_questions(args.questions, args.threshold, args.max_entries)
+        print()
+
+    if args.pairs and Path(args.pairs).exists():
+        pairs = read_pairs(args.pairs)
+        print("Labelled pairs:")
+        evaluate_pairs(pairs, args.threshold, show_misses=True)
+        print()
+        sweep_thresholds(pairs)
+        print()
+
+    print("Near-miss regression check:")
+    if evaluate_pairs(NEAR_MISS_PAIRS, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Local fake OpenAI server for testing ModelClient
+- Serves POST /v1/chat/completions with injected delays and errors
+- Run the bot against it: OPENAI_BASE_URL=http://127.0.0.1:8099/v1
+- Or run a load check through ModelClient: python fake_openai_server.py --check
+
+Usage: python fake_openai_server.py [--port 8099] [--delay 0.2] [--slow-rate 0.1]
+                                    [--slow-delay 5] [--error-rate 0.05] [--check]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(args):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if random.random() < args.error_rate:
+                self._send(500, {"error": {"message": "injected error", "type": "server_error"}})
+                return
+
+            delay = args.slow_delay if random.random() < args.slow_rate else args.delay
+            time.sleep(delay)
+
+            self._send(200, {
+                "id": f"chatcmpl-fake-{random.getrandbits(32):x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"fake answer after {delay:.2f}s"},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+            })
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client gave up (timeout or lost hedge)
+                pass
+
+        def log_message(self, format, *log_args):
+            pass
+
+    return FakeOpenAIHandler
+
+
+async def run_check(args):
+    """Send requests through ModelClient and report sources and latency"""
+    from openai import AsyncOpenAI
+    from model_client import ModelClient, ModelUnavailable
+
+    client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{args.port}/v1")
+    model_client = ModelClient(
+        client,
+        model="gpt-4o-mini",
+        budgets={"chat": args.budget},
+        fallback_model="fallback-model",
+        fallback_timeout=args.budget,
+        hedging=True
+    )
+
+    sources = Counter()
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        try:
+            completion = await model_client.complete(
+                "chat",
+                fallback_answer=lambda: "cached answer",
+                messages=[{"role": "user", "content": "hi"}]
+            )
+            sources[completion.source] += 1
+        except ModelUnavailable:
+            sources["unavailable"] += 1
+        latencies.append(time.perf_counter() - start)
+
+    for _ in range(args.requests // args.concurrency):
+        await asyncio.gather(*(one() for _ in range(args.concurrency)))
+
+    latencies.sort()
+    print(f"Requests:    {len(latencies)}")
+    for source, count in sources.most_common():
+        print(f"  {source:<16}{count}")
+    print(f"Latency p50: {statistics.median(latencies):.3f} s")
+    print(f"Latency p95: {latencies[int(len(latencies) * 0.95) - 1]:.3f} s")
+    print(f"Latency max: {latencies[-1]:.3f} s")
+    print(f"Circuit open: {model_client.breakers[model_client.model].is_open}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--check", action="store_true", help="Run a load check through ModelClient")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    server.daemon_threads = True
+
+    if not args.check:
+        print(f"Fake OpenAI server on http://127.0.0.1:{args.port}/v1")
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    asyncio.run(run_check(args))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Tail-latency protection for OpenAI chat completions
+- Per-mode latency budgets: a hard deadline for the whole call, SDK retries and fallbacks included
+- Circuit breaker per model, opens on consecutive upstream errors (timeouts, connection errors, 429, 5xx)
+- Client errors (other 4xx, e.g. an unreadable photo) are raised as-is: they say nothing about the model
+- Optional hedged request once the primary is slower than its p95
+- Fallback model, then a fallback answer (e.g. the answer cache)
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(Exception):
+    """Neither the primary model, the fallback model nor the fallback answer could answer"""
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str | None
+    tokens: int
+    source: str  # primary | hedge | fallback_model | fallback_answer
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error says the model is unhealthy, as opposed to a bad request"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Open after `threshold` consecutive failures, allow one trial per `cooldown` seconds"""
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.threshold
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+
+        # Half-open: let a single trial request through per cooldown period
+        now = time.monotonic()
+        if now - self.opened_at >= self.cooldown:
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.is_open:
+            logger.info(f"✅ Circuit closed for {self.name}")
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures == self.threshold:
+            logger.warning(f"⚠️ Circuit opened for {self.name} after {self.failures} errors")
+        if self.is_open:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> float | None:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class ModelClient:
+    """Wraps AsyncOpenAI chat completions with budgets, circuit breaking, hedging and fallbacks"""
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        budgets: dict[str, float],
+        fallback_model: str | None = None,
+        fallback_timeout: float = 10.0,
+        fallback_share: float = 0.3,
+        hedging: bool = False,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0
+    ):
+        self.client = client
+        self.model = model
+        self.budgets = budgets
+        self.fallback_model = fallback_model
+        self.fallback_timeout = fallback_timeout
+        self.fallback_share = fallback_share
+        self.hedging = hedging
+        self.breakers = {
+            name: CircuitBreaker(name, failure_threshold, cooldown)
+            for name in filter(None, [model, fallback_model])
+        }
+        self.latency = LatencyTracker()
+
+    async def _call(self, model: str, timeout: float, kwargs: dict):
+        breaker = self.breakers[model]
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(model=model, timeout=timeout, **kwargs),
+                timeout
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race, not a failure
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                breaker.record_failure()
+            raise
+
+        breaker.record_success()
+        if model == self.model:
+            self.latency.add(time.monotonic() - start)
+        return response
+
+    async def _call_primary(self, timeout: float, kwargs: dict) -> tuple:
+        """Call the primary model, hedging with a second request past its p95"""
+        first = asyncio.create_task(self._call(self.model, timeout, kwargs))
+
+        delay = self.latency.p95() if self.hedging else None
+        if delay is None or delay >= timeout:
+            return await first, "primary"
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result(), "primary"
+
+        second = asyncio.create_task(self._call(self.model, timeout - delay, kwargs))
+        sources = {first: "primary", second: "hedge"}
+        pending = set(sources)
+        error = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), sources[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(
+        self,
+        mode: str,
+        fallback_answer: Callable[[], str | None] | None = None,
+        **kwargs
+    ) -> Completion:
+        """Create a chat completion for `mode` within its budget, degrading to fallbacks instead of stalling"""
+        budget = self.budgets.get(mode, self.fallback_timeout)
+        deadline = time.monotonic() + budget
+
+        # Keep part of the budget for the fallback model so a stalled primary can't use it all
+        reserve = min(self.fallback_timeout, budget * self.fallback_share) if self.fallback_model else 0
+
+        if self.breakers[self.model].allow():
+            try:
+                response, source = await self._call_primary(budget - reserve, kwargs)
+                return self._completion(response, source)
+            except Exception as e:
+                logger.error(f"OpenAI error ({self.model}, {mode}): {type(e).__name__}: {e}")
+                # The fallback model would reject the same request
+                if not is_upstream_failure(e):
+                    raise
+
+        remaining = deadline - time.monotonic()
+        if self.fallback_model and remaining > 0 and self.breakers[self.fallback_model].allow():
+            try:
+                response = await self._call(self.fallback_model, min(self.fallback_timeout, remaining), kwargs)
+                return self._completion(response, "fallback_model")
+            except Exception as e:
+                logger.error(f"OpenAI error ({self.fallback_model}, {mode}): {type(e).__name__}: {e}")
+                if not is_upstream_failure(e):
+                    raise
+
+        if fallback_answer:
+            text = fallback_answer()
+            if text:
+                return Completion(text, None, 0, "fallback_answer")
+
+        raise ModelUnavailable(f"No model available for {mode}")
+
+    @staticmethod
+    def _completion(response, source: str) -> Completion:
+        usage = getattr(response, "usage", None)
+        return Completion(
+            text=response.choices[0].message.content,
+            model=response.model,
+            tokens=usage.total_tokens if usage else 0,
+            source=source
+        )
@@ -0,0 +1,177 @@
+"""
+Per-update tracing
+- Opt-in, sampled (TRACE_SAMPLE_RATE, 0 = off)
+- Spans via contextvars, a no-op when the update is not sampled
+- Updates slower than SLOW_UPDATE_MS go to a JSON-lines slow log with the span breakdown
+- Optional export to an OTLP/HTTP collector (OTLP_ENDPOINT, e.g. http://localhost:4318)
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "2000"))
+SLOW_LOG_PATH = Path(os.getenv("SLOW_LOG_PATH", Path(__file__).parent / "slow_updates.log"))
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "").rstrip("/")
+SERVICE_NAME = "ai-tutor-bot"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Slow log: one JSON object per line
+slow_logger = logging.getLogger("slow_updates")
+slow_logger.propagate = False
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict | None = None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """All spans recorded for one update"""
+
+    def __init__(self, name: str, attributes: dict | None = None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, None, attributes)
+        self.spans = [self.root]
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "time": self.root.start_ns // 1_000_000_000,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "error": self.error,
+            "attributes": self.root.attributes,
+            "spans": [
+                {
+                    "name": s.name,
+                    "start_ms": round((s.start_ns - self.root.start_ns) / 1e6, 2),
+                    "duration_ms": round(s.duration_ms, 2),
+                    **({"attributes": s.attributes} if s.attributes else {})
+                }
+                for s in self.spans[1:]
+            ]
+        }
+
+    def to_otlp(self) -> dict:
+        """OTLP/HTTP JSON payload"""
+        def attrs(values: dict) -> list:
+            return [{"key": k, "value": {"stringValue": str(v)}} for k, v in values.items()]
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attrs({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [
+                        {
+                            "traceId": self.trace_id,
+                            "spanId": s.span_id,
+                            **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                            "name": s.name,
+                            "kind": 2 if s is self.root else 1,
+                            "startTimeUnixNano": str(s.start_ns),
+                            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                            "attributes": attrs(s.attributes)
+                        }
+                        for s in self.spans
+                    ]
+                }]
+            }]
+        }
+
+
+def start_trace(name: str, **attributes) -> Trace | None:
+    """Start a trace for the current update if it is sampled"""
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+
+    trace = Trace(name, attributes)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+def finish_trace(trace: Trace):
+    """Close the trace, write it to the slow log if needed and export it"""
+    trace.root.end_ns = time.time_ns()
+    _current_trace.set(None)
+    _current_span.set(None)
+
+    if trace.root.duration_ms >= SLOW_UPDATE_MS:
+        slow_logger.warning(json.dumps(trace.to_dict(), ensure_ascii=False))
+
+    if OTLP_ENDPOINT:
+        asyncio.get_running_loop().run_in_executor(None, _export, trace.to_otlp())
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a span inside the current trace (no-op when not sampled)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def setup_slow_log():
+    """Attach the JSON-lines file handler to the slow log"""
+    if TRACE_SAMPLE_RATE <= 0 or slow_logger.handlers:
+        return
+
+    handler = logging.FileHandler(SLOW_LOG_PATH, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_logger.addHandler(handler)
+    logger.info(f"✅ Tracing enabled: sample rate {TRACE_SAMPLE_RATE}, slow threshold {SLOW_UPDATE_MS:.0f} ms")
+
+
+def _export(payload: dict):
+    """Send one trace to the OTLP collector (runs in a worker thread)"""
+    request = urllib.request.Request(
+        f"{OTLP_ENDPOINT}/v1/traces",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        urllib.request.urlopen(request, timeout=2).close()
+    except Exception as e:
+        logger.debug(f"OTLP export failed: {e}")
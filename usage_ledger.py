@@ -0,0 +1,267 @@
+"""
+Usage ledger
+- Append-only usage_events (user, mode, tokens, latency, cache hit)
+- Events are buffered in memory and written in batches off the hot path
+- Each batch is rolled up into usage_daily (per day and mode) and usage_daily_users (per day and user)
+- One-time importer for the old JS bot's stats.json
+
+Import: python usage_ledger.py stats.json
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STATS_JSON_IMPORT_KEY = "stats_json_imported"
+
+
+def init_ledger(db_path: Path):
+    """Create ledger and rollup tables"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usage_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            tokens INTEGER DEFAULT 0,
+            latency_ms INTEGER DEFAULT 0,
+            cache_hit INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            day TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            requests INTEGER DEFAULT 0,
+            tokens INTEGER DEFAULT 0,
+            cache_hits INTEGER DEFAULT 0,
+            latency_ms_total INTEGER DEFAULT 0,
+            PRIMARY KEY (day, mode)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usage_daily_users (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            requests INTEGER DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+def _rollup(cursor: sqlite3.Cursor, daily: dict, daily_users: dict):
+    """Add aggregated counters to the rollup tables"""
+    cursor.executemany("""
+        INSERT INTO usage_daily (day, mode, requests, tokens, cache_hits, latency_ms_total)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, mode) DO UPDATE SET
+            requests = requests + excluded.requests,
+            tokens = tokens + excluded.tokens,
+            cache_hits = cache_hits + excluded.cache_hits,
+            latency_ms_total = latency_ms_total + excluded.latency_ms_total
+    """, [(day, mode, *counters) for (day, mode), counters in daily.items()])
+
+    cursor.executemany("""
+        INSERT INTO usage_daily_users (day, user_id, requests)
+        VALUES (?, ?, ?)
+        ON CONFLICT (day, user_id) DO UPDATE SET requests = requests + excluded.requests
+    """, [(day, user_id, requests) for (day, user_id), requests in daily_users.items()])
+
+
+class UsageLedger:
+    """Buffers usage events and writes them in batches"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def record(self, user_id: int, mode: str, tokens: int = 0, latency_ms: float = 0, cache_hit: bool = False):
+        """Queue one usage event (no I/O)"""
+        event = (
+            datetime.now().isoformat(timespec="seconds"),
+            user_id,
+            mode,
+            tokens,
+            int(latency_ms),
+            int(cache_hit)
+        )
+        with self._lock:
+            self._buffer.append(event)
+
+    def flush(self) -> int:
+        """
+        Write buffered events and update rollups in one transaction. Returns event count.
+        On a database error the events go back to the front of the buffer and the error is raised.
+        """
+        with self._lock:
+            events, self._buffer = self._buffer, []
+
+        if not events:
+            return 0
+
+        daily = {}
+        daily_users = {}
+        for created_at, user_id, mode, tokens, latency_ms, cache_hit in events:
+            day = created_at[:10]
+
+            counters = daily.setdefault((day, mode), [0, 0, 0, 0])
+            counters[0] += 1
+            counters[1] += tokens
+            counters[2] += cache_hit
+            counters[3] += latency_ms
+
+            daily_users[(day, user_id)] = daily_users.get((day, user_id), 0) + 1
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.executemany("""
+                    INSERT INTO usage_events (created_at, user_id, mode, tokens, latency_ms, cache_hit)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, events)
+                _rollup(cursor, daily, daily_users)
+                conn.commit()
+            finally:
+                # Closing without commit rolls the whole batch back
+                conn.close()
+        except sqlite3.Error:
+            with self._lock:
+                self._buffer[:0] = events
+            raise
+
+        return len(events)
+
+
+def get_usage_summary(db_path: Path, days: int = 7) -> dict:
+    """Read today's and the last `days` days' numbers from the rollup tables"""
+    today = datetime.now().date()
+    since = (today - timedelta(days=days - 1)).isoformat()
+    today = today.isoformat()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM usage_daily_users WHERE day = ?", (today,))
+    dau = cursor.fetchone()[0]
+
+    cursor.execute("SELECT COUNT(DISTINCT user_id) FROM usage_daily_users WHERE day >= ?", (since,))
+    active_period = cursor.fetchone()[0]
+
+    cursor.execute("""
+        SELECT mode, requests, tokens, cache_hits, latency_ms_total
+        FROM usage_daily WHERE day = ? ORDER BY requests DESC
+    """, (today,))
+    modes_today = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(tokens), 0)
+        FROM usage_daily WHERE day >= ?
+    """, (since,))
+    requests_period, tokens_period = cursor.fetchone()
+
+    conn.close()
+
+    requests_today = sum(row[1] for row in modes_today)
+    latency_total = sum(row[4] for row in modes_today)
+
+    return {
+        "dau": dau,
+        "active_period": active_period,
+        "requests_today": requests_today,
+        "tokens_today": sum(row[2] for row in modes_today),
+        "cache_hits_today": sum(row[3] for row in modes_today),
+        "avg_latency_ms": latency_total / requests_today if requests_today else 0,
+        "modes_today": {row[0]: row[1] for row in modes_today},
+        "requests_period": requests_period,
+        "tokens_period": tokens_period,
+        "days": days
+    }
+
+
+def import_stats_json(db_path: Path, stats_path: Path) -> int | None:
+    """
+    One-time import of the old JS bot's stats.json into the rollup tables.
+
+    `count` (requests on `date`) becomes "legacy" requests on that day; lifetime
+    `messages` / `photos` become chat / photo requests on the `lastActive` day.
+    Every imported request is added to both usage_daily and usage_daily_users,
+    so per-day and per-user totals agree.
+    Returns the number of users in the file, or None if it was already imported.
+    """
+    init_ledger(db_path)
+
+    with open(stats_path, encoding="utf-8") as f:
+        stats = json.load(f)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT value FROM ledger_meta WHERE key = ?", (STATS_JSON_IMPORT_KEY,))
+    if cursor.fetchone():
+        conn.close()
+        return None
+
+    daily = {}
+    daily_users = {}
+    for user_id, entry in stats.items():
+        day = entry.get("date") or entry.get("lastActive")
+        last_active = entry.get("lastActive") or day
+        if not day:
+            continue
+
+        sources = (
+            ("legacy", "count", day),
+            ("chat", "messages", last_active),
+            ("photo", "photos", last_active)
+        )
+        for mode, key, when in sources:
+            requests = entry.get(key)
+            if not requests:
+                continue
+
+            daily.setdefault((when, mode), [0, 0, 0, 0])[0] += requests
+            daily_users[(when, int(user_id))] = daily_users.get((when, int(user_id)), 0) + requests
+
+    _rollup(cursor, daily, daily_users)
+    cursor.execute(
+        "INSERT INTO ledger_meta (key, value) VALUES (?, ?)",
+        (STATS_JSON_IMPORT_KEY, datetime.now().isoformat())
+    )
+
+    conn.commit()
+    conn.close()
+    return len(stats)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python usage_ledger.py <stats.json>")
+        sys.exit(1)
+
+    db_path = Path(__file__).parent / "ai_tutor_bot.db"
+    imported = import_stats_json(db_path, Path(sys.argv[1]))
+
+    if imported is not None:
+        print(f"✅ Imported {imported} users from {sys.argv[1]}")
+    else:
+        print("ℹ️ stats.json was already imported")